@@ -1,17 +1,17 @@
 import os
 import re
 import zipfile
-import requests
+import numpy as np
 import pandas as pd
 from lxml import etree
-from openpyxl.worksheet.table import Table, TableStyleInfo
 
 # --- Global Debug Toggle ---
 DEBUG_MODE = False
 
-def debug_print(msg):
+def debug_print(msg, *args):
+    """Print a debug message; `msg % args` is only formatted when DEBUG_MODE is on."""
     if DEBUG_MODE:
-        print(f"[DEBUG] {msg}")
+        print(f"[DEBUG] {msg % args if args else msg}")
 
 # --- Load CSVs ---
 def load_csv_with_required_columns(path, required_cols):
@@ -31,13 +31,23 @@ def load_keyword_list(path):
 # --- Download and Extract ---
 def download_zip(url, zip_path, force=False):
     if os.path.exists(zip_path) and not force:
-        debug_print(f"Zip exists at {zip_path}")
+        debug_print("Zip exists at %s", zip_path)
         return
-    debug_print(f"Downloading from {url}...")
-    resp = requests.get(url)
-    resp.raise_for_status()
-    with open(zip_path, 'wb') as f:
-        f.write(resp.content)
+    import requests
+    debug_print("Downloading from %s...", url)
+    # Stream into a temp file next to zip_path and only move it into place once
+    # complete, so an interrupted download never leaves a truncated zip behind
+    tmp_path = f"{zip_path}.part"
+    try:
+        with requests.get(url, stream=True) as resp:
+            resp.raise_for_status()
+            with open(tmp_path, 'wb') as f:
+                for chunk in resp.iter_content(chunk_size=1 << 20):
+                    f.write(chunk)
+        os.replace(tmp_path, zip_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
     debug_print("Download complete.")
 
 def extract_zip(zip_path, extract_dir):
@@ -49,8 +59,12 @@ def extract_zip(zip_path, extract_dir):
     debug_print("Extraction complete.")
 
 # --- XML Utilities ---
+NON_PRINTABLE_RE = re.compile(r'[^\x20-\x7E]+')
+NON_XML_CHAR_RE = re.compile(r'[^\x09\x0A\x0D\x20-\x7E]+')
+SUBMITTAL_RE = re.compile(r"(SD-[0-9]{2})")
+
 def clean_text(text):
-    return re.sub(r'[^\x20-\x7E]+', '', text.strip()) if text else ''
+    return NON_PRINTABLE_RE.sub('', text.strip()) if text else ''
 
 def extract_text(el):
     return clean_text(''.join(el.itertext())) if el is not None else ''
@@ -78,6 +92,8 @@ def parse_spt(el, depth, numbering, ufgs_id, submittal=None):
     rows = []
     num_str = '.'.join(map(str, numbering))
     _add_row(rows, depth, 'SPT', num_str, el.find('TTL'), ufgs_id)
+    # Every nested SPT under this parent shares one number: count of nested SPTs + 1
+    child_numbering = None
     for ch in el:
         tag = ch.tag
         if tag == 'SCP':
@@ -91,7 +107,7 @@ def parse_spt(el, depth, numbering, ufgs_id, submittal=None):
         elif tag == 'LST':
             sub = ch.find('SUB')
             val = extract_text(sub)
-            match = re.match(r"(SD-[0-9]{2})", val)
+            match = SUBMITTAL_RE.match(val)
             submittal = match.group(1) if match else None
             _add_row(rows, depth+1, 'LST', num_str, ch, ufgs_id, submittal, text=val)
         elif tag == 'ITM':
@@ -102,13 +118,14 @@ def parse_spt(el, depth, numbering, ufgs_id, submittal=None):
             itm_depth = depth + 2 if submittal else depth + 1
             _add_row(rows, itm_depth, tag, num_str, ch, ufgs_id, submittal, clss, text=name)
         elif tag == 'SPT':
-            new_num = numbering + [len(el.findall('./SPT')) + 1]
-            rows += parse_spt(ch, depth+1, new_num, ufgs_id, submittal)
+            if child_numbering is None:
+                child_numbering = numbering + [len(el.findall('./SPT')) + 1]
+            rows += parse_spt(ch, depth+1, child_numbering, ufgs_id, submittal)
     return rows
 
 def parse_sec_file(path, ufgs_id):
     with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-        raw = re.sub(r'[^\x09\x0A\x0D\x20-\x7E]', '', f.read())
+        raw = NON_XML_CHAR_RE.sub('', f.read())
     root = etree.fromstring(raw.encode('utf-8'))
     rows = []
     for tag in ['SCN', 'STL', 'DTE', 'PRA']:
@@ -122,13 +139,25 @@ def parse_sec_file(path, ufgs_id):
     return rows
 
 # --- Keyword Warning ---
-def keyword_warning(val, df_keywords):
-    alerts = []
-    for _, row in df_keywords.iterrows():
-        if re.search(rf"\b{re.escape(row['Keyword'])}\b", str(val), re.IGNORECASE):
-            replacement = f" — use '{row['Recommended Replacement']}'" if row['Recommended Replacement'] else ""
-            alerts.append(f"Avoid '{row['Keyword']}'{replacement} [{row['ID']}]")
-    return "; ".join(alerts) if alerts else ""
+def compile_keyword_rules(df_keywords):
+    """Precompile per-keyword patterns plus one fused pattern to skip clean values."""
+    rules = []
+    if df_keywords.empty:
+        return None, rules
+    for kw_id, keyword, recommended in zip(df_keywords['ID'], df_keywords['Keyword'],
+                                           df_keywords['Recommended Replacement']):
+        pattern = re.compile(rf"\b{re.escape(keyword)}\b", re.IGNORECASE)
+        replacement = f" — use '{recommended}'" if recommended else ""
+        rules.append((pattern, f"Avoid '{keyword}'{replacement} [{kw_id}]"))
+    fused = re.compile('|'.join(p.pattern for p, _ in rules), re.IGNORECASE) if rules else None
+    return fused, rules
+
+def keyword_warning(val, df_keywords, compiled_rules=None):
+    fused, rules = compiled_rules if compiled_rules is not None else compile_keyword_rules(df_keywords)
+    text = str(val)
+    if fused is None or not fused.search(text):
+        return ""
+    return "; ".join(msg for pattern, msg in rules if pattern.search(text))
 
 # --- Main Parser ---
 def parse_all_sec_files(zip_url, zip_path, extract_dir, discipline_csv_path, keyword_csv_path,
@@ -148,14 +177,14 @@ def parse_all_sec_files(zip_url, zip_path, extract_dir, discipline_csv_path, key
 
     # Step 3: Parse all SEC files
     combined, missing = [], []
-    ufgs_sections = {f"{row['UFGS']}.SEC": row['UFGS'] for _, row in df_discipline.iterrows()}
+    ufgs_sections = {f"{ufgs}.SEC": ufgs for ufgs in df_discipline['UFGS']}
 
     for file, ufgs in ufgs_sections.items():
         path = os.path.join(extract_dir, file)
         if os.path.exists(path):
             combined += parse_sec_file(path, ufgs)
         else:
-            debug_print(f"Missing file: {file}")
+            debug_print("Missing file: %s", file)
             missing.append(file)
 
     # Step 4: Build DataFrame
@@ -164,24 +193,39 @@ def parse_all_sec_files(zip_url, zip_path, extract_dir, discipline_csv_path, key
         'SUBMITTAL_CODE', 'Submittal Classification Code', 'UFGS'
     ])
     df.insert(0, 'ID', range(1, len(df) + 1))
-    df['SEC TAG'] = df['SEC TAG'].apply(lambda x: f"<{x}>")
-    df['TAG LABEL'] = df.apply(lambda r: (
-        'Heading' if r['NEST_DEPTH'] == 0 else
-        'PART' if r['SEC TAG'] == '<PRT>' else
-        'ARTICLE' if r['SEC TAG'] == '<SPT>' and r['Number'].count('.') == 1 else
-        'Paragraph' if r['SEC TAG'] == '<SPT>' and r['Number'].count('.') == 2 else
-        'Subparagraph' if r['SEC TAG'] == '<SPT>' else
-        'English Measurement Units' if r['SEC TAG'] == '<ENG>' else
-        'Metric Measurement Units' if r['SEC TAG'] == '<MET>' else
-        'Preparing Activity' if r['SEC TAG'] == '<PRA>' else
-        'Section Scope' if r['SEC TAG'] == '<SCP>' else ''
-    ), axis=1)
+    df['SEC TAG'] = '<' + df['SEC TAG'] + '>'
+    tag, dots = df['SEC TAG'], df['Number'].str.count(r'\.')
+    df['TAG LABEL'] = np.select([
+        df['NEST_DEPTH'] == 0,
+        tag == '<PRT>',
+        (tag == '<SPT>') & (dots == 1),
+        (tag == '<SPT>') & (dots == 2),
+        tag == '<SPT>',
+        tag == '<ENG>',
+        tag == '<MET>',
+        tag == '<PRA>',
+        tag == '<SCP>',
+    ], [
+        'Heading',
+        'PART',
+        'ARTICLE',
+        'Paragraph',
+        'Subparagraph',
+        'English Measurement Units',
+        'Metric Measurement Units',
+        'Preparing Activity',
+        'Section Scope',
+    ], default='')
 
     if include_keyword_warnings:
-        df["Keyword Warning"] = df["Value"].apply(lambda val: keyword_warning(val, df_keywords))
+        keyword_rules = compile_keyword_rules(df_keywords)
+        # Boilerplate repeats across sections, so check each distinct value once
+        warnings = {val: keyword_warning(val, df_keywords, keyword_rules) for val in df["Value"].unique()}
+        df["Keyword Warning"] = df["Value"].map(warnings)
 
     # Step 5: Export Excel
     if output_excel_path:
+        from openpyxl.worksheet.table import Table, TableStyleInfo
         with pd.ExcelWriter(output_excel_path, engine='openpyxl') as writer:
             df.to_excel(writer, index=False, sheet_name="ParsedData")
             df_discipline.to_excel(writer, index=False, sheet_name="DisciplineMap")
@@ -3,64 +3,128 @@ import streamlit as st
 import pandas as pd
 import json
 import fitz  # PyMuPDF
-from PIL import Image, ImageDraw, ImageFont
-import io
+from PIL import Image, ImageColor, ImageDraw, ImageFont
 import os
 
 st.set_page_config(layout="wide")
 st.title("📄 UFC PDF Visualizer with Keyword Pills")
 
+# Resolve inputs next to this script so the app runs from any working directory
+app_dir = os.path.dirname(os.path.abspath(__file__))
+keywords_path = os.path.join(app_dir, "keywords.csv")
+metadata_path = os.path.join(app_dir, "data", "deontic_metadata.csv")
+pdf_path = os.path.join(app_dir, "data", "ufc_example.pdf")
+
+# Check inputs
+for path in (keywords_path, metadata_path, pdf_path):
+    if not os.path.isfile(path):
+        st.error(f"Place '{os.path.basename(path)}' inside {os.path.dirname(path)}/")
+        st.stop()
+    if os.path.getsize(path) == 0:
+        st.error(f"'{path}' is empty")
+        st.stop()
+
+font = ImageFont.load_default()
+
+# Measure text with textbbox, or textsize on Pillow versions without it
+if hasattr(ImageDraw.ImageDraw, "textbbox"):
+    def text_size(draw, text):
+        _, _, right, bottom = draw.textbbox((0, 0), text, font=font)
+        return right, bottom
+else:
+    def text_size(draw, text):
+        return draw.textsize(text, font=font)
+
 # Load keywords
-keyword_df = pd.read_csv("streamlit-test/keywords.csv")
+@st.cache_resource(max_entries=1)
+def load_keywords(path, mtime):
+    """Load keyword styling; `mtime` keys the cache to the file's contents."""
+    keyword_df = pd.read_csv(path, usecols=["keyword", "category", "color"], dtype=str)
+    keyword_df["keyword"] = keyword_df["keyword"].str.lower()
+
+    # keyword -> (pill label, RGB color, label size)
+    scratch = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    keyword_map = {}
+    for r in keyword_df.itertuples(index=False):
+        label = f" {r.category} "
+        keyword_map[r.keyword] = (label, ImageColor.getrgb(r.color), text_size(scratch, label))
+    category_colors = {r.category: r.color for r in keyword_df.itertuples()}
+    return keyword_map, category_colors
 
-keyword_map = {
-    row["keyword"].lower(): {"category": row["category"], "color": row["color"]}
-    for _, row in keyword_df.iterrows()
-}
-category_colors = {r.category: r.color for r in keyword_df.itertuples()}
 
 # Load metadata & PDF
-df = pd.read_csv("data/deontic_metadata.csv")
-pdf_path = "data/ufc_example.pdf"
-if not os.path.exists(pdf_path):
-    st.error("Place 'ufc_example.pdf' inside data/")
-    st.stop()
+BBOX_COLUMNS = ["x0", "y0", "x1", "y1"]
+
+
+@st.cache_resource(max_entries=1)
+def load_metadata(path, mtime, keywords_path, keywords_mtime):
+    """Read the metadata CSV and precompute its keyword hits; the shared frame must not be mutated."""
+    keywords = load_keywords(keywords_path, keywords_mtime)
+    keyword_map, _ = keywords
+    df = pd.read_csv(
+        path,
+        usecols=["page", "content", "bounding_box"],
+        dtype={"page": "int32", "content": str, "bounding_box": str},
+    )
+    df["content_lower"] = df["content"].str.lower()  # shared by the search filter and keyword scan
+    # Parse the bounding-box JSON into coordinate columns
+    df[BBOX_COLUMNS] = pd.DataFrame(
+        df["bounding_box"].map(json.loads).tolist(), columns=BBOX_COLUMNS, index=df.index
+    )
+    # Scan each distinct text for keywords
+    hits = {text: [kw for kw in keyword_map if kw in text] for text in df["content_lower"].unique()}
+    df["keywords"] = df["content_lower"].map(hits.__getitem__)
+    df["has_keywords"] = df["keywords"].map(bool)
+    visible_pages = sorted(df["page"].unique())
+    return df, visible_pages, keywords
+
+
+# Draw with the keyword set the hits were computed from
+df, visible_pages, (keyword_map, category_colors) = load_metadata(
+    metadata_path, os.path.getmtime(metadata_path), keywords_path, os.path.getmtime(keywords_path)
+)
+
+
+@st.cache_resource(max_entries=64)
+def render_page(path, mtime, page_num, dpi=150):
+    """Rasterize one page with a private document handle; copy the shared image before drawing."""
+    with fitz.open(path) as doc:
+        pix = doc.load_page(page_num).get_pixmap(dpi=dpi)
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
 
-# Open the PDF once and reuse the document
-doc = fitz.open(pdf_path)
 
-visible_pages = sorted(df["page"].unique())
+pdf_mtime = os.path.getmtime(pdf_path)
 max_per_row = st.sidebar.slider("Pages per row", 2, 6, 3)
-keyword_search = st.sidebar.text_input("🔍 Filter Keywords")
+keyword_search = st.sidebar.text_input("🔍 Filter Keywords").lower()
+
+# Rows with keyword hits that match the search, grouped by page
+highlight_df = df[df["has_keywords"]]
+if keyword_search:
+    highlight_df = highlight_df[highlight_df["content_lower"].str.contains(keyword_search, regex=False)]
+highlights_by_page = dict(tuple(highlight_df.groupby("page")))
 
-font = ImageFont.load_default()
+
+def draw_highlights(img, page_df):
+    """Draw keyword outlines and label pills onto `img` for the rows in `page_df`."""
+    draw = ImageDraw.Draw(img)
+    rows = page_df[BBOX_COLUMNS + ["keywords"]].itertuples(index=False, name=None)
+    for x0, y0, x1, y1, hits in rows:
+        for kw in hits:
+            text, color, (w, h) = keyword_map[kw]
+            rx0, ry0 = x0, y0 - h - 6
+            draw.rounded_rectangle([rx0, ry0, rx0 + w + 4, ry0 + h + 4], radius=8, fill=color)
+            draw.text((rx0 + 2, ry0 + 2), text, fill="white", font=font)
+            draw.rectangle([x0, y0, x1, y1], outline=color, width=2)
+    return img
 
 for i in range(0, len(visible_pages), max_per_row):
     cols = st.columns(len(visible_pages[i:i + max_per_row]))
     for j, page_num in enumerate(visible_pages[i:i + max_per_row]):
-        page_df = df[df["page"] == page_num]
-        page = doc.load_page(page_num)
-        pix = page.get_pixmap(dpi=150)
-        img = Image.open(io.BytesIO(pix.tobytes("png")))
-        draw = ImageDraw.Draw(img)
-
-        for _, row in page_df.iterrows():
-            content = row["content"].lower()
-            if keyword_search and keyword_search.lower() not in content:
-                continue
-            bbox = json.loads(row["bounding_box"])
-            x0, y0, x1, y1 = bbox["x0"], bbox["y0"], bbox["x1"], bbox["y1"]
-            for kw, meta in keyword_map.items():
-                if kw in content:
-                    color = meta["color"]
-                    label = meta["category"]
-                    text = f" {label} "
-                    w, h = draw.textsize(text, font=font)
-                    rx0, ry0 = x0, y0 - h - 6
-                    rx1, ry1 = rx0 + w + 4, ry0 + h + 4
-                    draw.rounded_rectangle([rx0, ry0, rx1, ry1], radius=8, fill=color)
-                    draw.text((rx0 + 2, ry0 + 2), text, fill="white", font=font)
-                    draw.rectangle([x0, y0, x1, y1], outline=color, width=2)
+        img = render_page(pdf_path, pdf_mtime, int(page_num))
+        page_df = highlights_by_page.get(page_num)
+        if page_df is not None:
+            # Draw on a copy; the cached render is shared
+            img = draw_highlights(img.copy(), page_df)
 
         cols[j].image(img, caption=f"Page {page_num + 1}", use_column_width=True)
 
@@ -71,6 +135,3 @@ for cat, color in category_colors.items():
         f"<div style='background:{color};padding:4px 10px;border-radius:20px;color:white;display:inline-block;margin:2px'>{cat}</div>",
         unsafe_allow_html=True
     )
-
-# Close the PDF document after rendering
-doc.close()